@@ -6,27 +6,39 @@ import time
 import mimetypes
 import shutil
 import json
+import re
 import urllib.request
+import http.client
+import hashlib
+import socket
+import tempfile
+from collections import defaultdict, deque
 from pathlib import Path
-from functools import wraps
-from datetime import datetime
-import glob
-from zoneinfo import ZoneInfo
+from uuid import uuid4
+from types import MappingProxyType
+from functools import wraps, lru_cache
+from datetime import datetime, timedelta, timezone
 import logging
 from logging.handlers import RotatingFileHandler
 import eventlet
 eventlet.monkey_patch()
+from eventlet import tpool
 
-from flask import Flask, render_template, request, jsonify, send_file, abort, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, send_file, send_from_directory, abort, session, redirect, url_for, Response, Request
 from flask_socketio import SocketIO, emit
 import pam
 import psutil
 from werkzeug.utils import secure_filename
 from werkzeug.middleware.proxy_fix import ProxyFix
 import threading
+from itsdangerous import URLSafeTimedSerializer, BadSignature
 import yt_dlp
 import jwt
-from urllib.parse import urljoin, quote
+try:
+    import orjson
+except ImportError:  # pragma: no cover - fallback keeps dev setups working
+    orjson = None
+from urllib.parse import urljoin, quote, urlsplit
 from functools import wraps
 # -------------------
 
@@ -50,12 +62,15 @@ MAX_UPLOAD_MB = int(os.getenv('MAX_UPLOAD_MB', '51200'))
 DASH_MOUNTS = [Path(p) for p in os.getenv('DASH_MOUNTS', './storage').split(',')]
 EMPTY_TEMPLATE_DIR = Path('/app/empty_templates')
 REBOOT_ON_FAILURES = os.getenv('REBOOT_ON_FAILURES', '0') == '1'
+# hand downloads to the front proxy (nginx internal location /_protected/
+# aliased to STORAGE_ROOT) so Python never copies file bytes
+USE_XSENDFILE = os.getenv('USE_XSENDFILE', '0') == '1'
 CRITICAL_TEMP = int(os.getenv('CRITICAL_TEMP', '95'))
 WATCH_NET_IFACE = os.getenv('WATCH_NET_IFACE', None)
-ALLOWED_EXT = {
+ALLOWED_EXT = frozenset({
     'txt','pdf','png','jpg','jpeg','gif','mp4','mkv','avi','zip','rar','7z','srt','ass',
     'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'odt', 'ods', 'odp'
-}
+})
 LOG_PATH = DB_PATH.parent / 'koalacloud.log'
 
 ONLYOFFICE_JWT_SECRET   = os.getenv('ONLYOFFICE_JWT_SECRET', 'this-is-unsafe-change-it')
@@ -66,10 +81,47 @@ KOALA_INTERNAL_URL = os.getenv('KOALA_INTERNAL_URL', KOALA_PUBLIC_URL)
 # ---------------------------
 
 # ==================== App ====================
+# Werkzeug's multipart parser buffers file parts into a SpooledTemporaryFile
+# under /tmp, so a 10 GB upload was written twice (tmp, then final path).
+# Spool parts under STORAGE_ROOT instead so api_upload can just rename them
+# into place — one write pass, flat RSS.
+UPLOAD_TMP_DIR = STORAGE_ROOT / '.upload_tmp'
+
+_UMASK = os.umask(0)
+os.umask(_UMASK)  # umask(2) has no pure getter; set-and-restore to read it
+
+class _DirectUploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        UPLOAD_TMP_DIR.mkdir(parents=True, exist_ok=True)
+        f = tempfile.NamedTemporaryFile('wb+', dir=UPLOAD_TMP_DIR, prefix='part-', delete=False)
+        # NamedTemporaryFile creates 0600 and os.replace keeps it; these
+        # parts become the stored files, which smbd/jellyfin/nginx also
+        # read — restore the umask-default mode regular saves would get
+        os.fchmod(f.fileno(), 0o666 & ~_UMASK)
+        return f
+
 app = Flask(__name__, static_folder="static")
+app.request_class = _DirectUploadRequest
+# drop any parts orphaned by a crash mid-upload
+shutil.rmtree(UPLOAD_TMP_DIR, ignore_errors=True)
 app.config['SECRET_KEY'] = SECRET_KEY
 app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_MB * 1024 * 1024
-socketio = SocketIO(app, cors_allowed_origins='*')
+# pin eventlet explicitly (we monkey_patch above) so socket.io never falls
+# back to the threading mode's per-request thread pool
+socketio = SocketIO(app, cors_allowed_origins='*', async_mode='eventlet')
+
+if orjson is not None:
+    from flask.json.provider import JSONProvider
+
+    class _OrjsonProvider(JSONProvider):
+        """Route every jsonify/request.get_json through orjson's C encoder."""
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj).decode()
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+    app.json = _OrjsonProvider(app)
 
 DRIVE_ENABLED = True
 
@@ -86,6 +138,22 @@ app.logger.info('Koala Cloud starting up...')
 # trust Cloudflare's proxy headers
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
+@app.teardown_request
+def _cleanup_upload_parts(exc=None):
+    # uploads that never made it to os.replace (failed validation, client
+    # abort) leave their spooled part behind — unlink it here
+    files = request.__dict__.get('files')
+    if not files:
+        return
+    for fs in (v for vs in files.listvalues() for v in vs):
+        n = getattr(fs.stream, 'name', None)
+        if isinstance(n, str) and n.startswith(str(UPLOAD_TMP_DIR)) and os.path.exists(n):
+            try:
+                fs.close()
+                os.unlink(n)
+            except OSError:
+                pass
+
 @app.before_request
 def force_https_on_public_domain():
     host = request.headers.get('Host', '')
@@ -98,6 +166,7 @@ def force_https_on_public_domain():
 # ==================== Yatch ====================
 # --- ADD THIS GLOBAL VARIABLE (near your other globals) ---
 waiting_player_sid = None
+_WS_CLIENTS = set()  # connected socket.io sids
 # ---------------------------------------------------------
 
 # --- ADD THIS NEW ROUTE ---
@@ -129,6 +198,11 @@ def on_find_game():
         waiting_player_sid = player_sid
         emit('waiting_for_opponent')
 
+@socketio.on('connect')
+def on_connect():
+    """Tracks connected clients so background emitters can idle when nobody is watching."""
+    _WS_CLIENTS.add(request.sid)
+
 @socketio.on('game_action')
 def on_game_action(data):
     """Relays a game action from one player to their opponent."""
@@ -142,7 +216,8 @@ def on_disconnect():
     """Handles a player disconnecting."""
     global waiting_player_sid
     player_sid = request.sid
-    
+    _WS_CLIENTS.discard(player_sid)
+
     if player_sid == waiting_player_sid:
         app.logger.info(f"Waiting player disconnected: {player_sid}")
         waiting_player_sid = None
@@ -169,14 +244,65 @@ def load_service_map():
             mapping[name.strip()] = {'type': 'systemd', 'value': value.strip()}
     return mapping
 
-SERVICE_MAP = load_service_map()
+# frozen view: the map never changes after startup, and list_services can
+# iterate the precomputed tuple instead of rebuilding dict views per poll
+SERVICE_MAP = MappingProxyType(load_service_map())
+SERVICE_ITEMS = tuple(SERVICE_MAP.items())
+
+# fewer, bigger chunks when shutil has to fall back to a read/write loop
+shutil.COPY_BUFSIZE = 4 * 1024 * 1024
+
+def _fast_copy(src, dst, *, follow_symlinks=True):
+    """copy2 replacement that keeps the bytes in kernel space.
+
+    Tries copy_file_range (same-FS reflink/offload capable), then sendfile,
+    then a plain buffered copy. Metadata is preserved like copy2.
+    """
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        sfd, dfd = fsrc.fileno(), fdst.fileno()
+        remaining = os.fstat(sfd).st_size
+        try:
+            while remaining > 0:
+                n = os.copy_file_range(sfd, dfd, remaining)
+                if n == 0:
+                    break
+                remaining -= n
+        except OSError:
+            try:
+                offset = os.lseek(sfd, 0, os.SEEK_CUR)
+                while True:
+                    n = os.sendfile(dfd, sfd, offset, 64 * 1024 * 1024)
+                    if n == 0:
+                        break
+                    offset += n
+            except OSError:
+                shutil.copyfileobj(fsrc, fdst, length=shutil.COPY_BUFSIZE)
+    shutil.copystat(src, dst, follow_symlinks=follow_symlinks)
+    return dst
+
+def _json(obj):
+    """jsonify via orjson when available — C-speed encoding straight to bytes.
+    Worth it on api_list, where a big directory serializes thousands of dicts."""
+    if orjson is not None:
+        return Response(orjson.dumps(obj), mimetype='application/json')
+    return jsonify(obj)
 
 def allowed_file(name: str) -> bool:
-    return '.' in name and name.rsplit('.',1)[1].lower() in ALLOWED_EXT
+    i = name.rfind('.')
+    return i != -1 and name[i+1:].lower() in ALLOWED_EXT
+
+@lru_cache(maxsize=1024)
+def _guess_mime(name: str):
+    # guess_type walks its encoding/type maps on every call; the answer per
+    # filename never changes
+    return mimetypes.guess_type(name)[0]
+
+# one authenticator for the process; pam.pam() carries no per-login state
+# worth reallocating on every attempt
+_PAM = pam.pam()
 
 def check_password(user, pw) -> bool:
-    p = pam.pam()
-    return p.authenticate(user, pw, service=PAM_SERVICE)
+    return _PAM.authenticate(user, pw, service=PAM_SERVICE)
 
 # In app.py, find and replace this function
 def _run_host_cmd(cmd, cwd=None):
@@ -184,23 +310,125 @@ def _run_host_cmd(cmd, cwd=None):
     if USE_NSENTER:
         base = ['nsenter','-t','1','-m','-p','-i','-u','-n','--']
     full_cmd = base + cmd
-    return subprocess.run(full_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    # subprocess.run would block the whole event loop for the duration of a
+    # slow command (docker compose up can take seconds); drain the pipes on
+    # a native thread instead so other greenlets keep running
+    p = subprocess.Popen(full_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = tpool.execute(p.communicate)
+    return subprocess.CompletedProcess(full_cmd, p.returncode, stdout, stderr)
+
+# Optional fast path: talk to systemd over D-Bus instead of forking
+# nsenter+systemctl. Only usable when we share the host's bus (no nsenter),
+# so the container setup keeps the subprocess path.
+try:
+    from pystemd.systemd1 import Unit as _PystemdUnit
+except ImportError:
+    _PystemdUnit = None
+
+# Same idea for compose services: one HTTP call over /var/run/docker.sock
+# beats a full docker CLI startup (~300 ms cold) through nsenter.
+try:
+    import docker as _docker_sdk
+except ImportError:
+    _docker_sdk = None
+
+_docker_client = None
+
+def _docker_api():
+    global _docker_client
+    if _docker_client is None:
+        _docker_client = _docker_sdk.from_env()
+    return _docker_client
+
+_DBUS_UNITS = {}  # unit name -> pystemd Unit
+
+def _dbus_unit(unit: str):
+    u = _DBUS_UNITS.get(unit)
+    if u is None:
+        u = _PystemdUnit(unit.encode(), _autoload=True)
+        _DBUS_UNITS[unit] = u
+    return u
+
+# Status checks fork nsenter+systemctl/docker per call, which adds up fast when
+# the admin dashboard polls. Cache results for a couple of seconds instead.
+_STATUS_CACHE = {}  # unit/path -> (ts, bool)
+_STATUS_TTL = 2.0
+
+def _status_cache_get(key):
+    hit = _STATUS_CACHE.get(key)
+    if hit and (time.time() - hit[0]) < _STATUS_TTL:
+        return hit[1]
+    return None
+
+def _status_cache_put(key, value: bool) -> bool:
+    _STATUS_CACHE[key] = (time.time(), value)
+    return value
+
+def _status_cache_invalidate(key):
+    _STATUS_CACHE.pop(key, None)
 
 def get_systemd_service_status(unit: str) -> bool:
+    cached = _status_cache_get(unit)
+    if cached is not None:
+        return cached
+    if _PystemdUnit is not None and not USE_NSENTER:
+        try:
+            active = _dbus_unit(unit).Unit.ActiveState == b'active'
+            return _status_cache_put(unit, active)
+        except Exception as e:
+            app.logger.warning(f'pystemd status check failed for {unit}, falling back: {e}')
     p = _run_host_cmd(['systemctl', 'is-active', '--quiet', unit])
-    return p.returncode == 0
+    return _status_cache_put(unit, p.returncode == 0)
 
 # In app.py, find and replace this function
+def _refresh_systemd_statuses(units):
+    """One `systemctl is-active u1 u2 ...` for several units — is-active
+    prints one state per line in argument order, so N stale units cost a
+    single fork instead of N."""
+    p = _run_host_cmd(['systemctl', 'is-active'] + list(units))
+    lines = p.stdout.decode(errors='ignore').splitlines()
+    for unit, state in zip(units, lines):
+        _status_cache_put(unit, state.strip() == 'active')
+
 def get_docker_service_status(path: str) -> bool:
+    cached = _status_cache_get(path)
+    if cached is not None:
+        return cached
+    if _docker_sdk is not None:
+        try:
+            # compose stamps containers with the project working dir
+            running = _docker_api().containers.list(
+                filters={'label': f'com.docker.compose.project.working_dir={path}'})
+            return _status_cache_put(path, bool(running))
+        except Exception as e:
+            app.logger.warning(f'docker API status check failed for {path}, falling back: {e}')
     # This command is now a single string that the host shell will execute
     shell_cmd_on_host = f"cd {path} && docker compose ps -q"
     p = _run_host_cmd(['sh', '-c', shell_cmd_on_host])
-    return p.returncode == 0 and p.stdout.strip() != b''
+    return _status_cache_put(path, p.returncode == 0 and p.stdout.strip() != b'')
+
+# Poll-heavy pages hit authenticated endpoints dozens of times per second;
+# verifying a small signed cookie is cheaper than deserializing the whole
+# session payload every time. The session stays as the fallback/source of
+# truth, the cookie is only ever a cached "yes".
+_AUTH_COOKIE = 'koala_auth'
+_AUTH_COOKIE_MAX_AGE = 12 * 3600
+_auth_serializer = URLSafeTimedSerializer(SECRET_KEY, salt='koala-auth-fast')
+
+def _fast_auth_ok() -> bool:
+    tok = request.cookies.get(_AUTH_COOKIE)
+    if not tok:
+        return False
+    try:
+        _auth_serializer.loads(tok, max_age=_AUTH_COOKIE_MAX_AGE)
+        return True
+    except BadSignature:
+        return False
 
 def auth_required_json(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
-        if not session.get('logged_in'):
+        if not (_fast_auth_ok() or session.get('logged_in')):
             return jsonify({'ok': False, 'error': 'Unauthorized', 'code': 401}), 401
         return func(*args, **kwargs)
     return wrapper
@@ -237,37 +465,122 @@ def api_create_new_doc():
         abort(500, 'Could not create file on server.')
     
     # Return the relative path for the editor
-    rel_path = str(target_path.relative_to(STORAGE_ROOT))
+    rel_path = _rel_to_root(target_path)
     return jsonify({'ok': True, 'path': rel_path})
 
 # --- NEW DECORATOR FOR PAGES ---
 def auth_required_page(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
-        if not session.get('logged_in'):
+        if not (_fast_auth_ok() or session.get('logged_in')):
             # For pages, redirect to the main page which shows the login form
-            return redirect(url_for('drive_root')) 
+            return redirect(url_for('drive_root'))
         return func(*args, **kwargs)
     return wrapper
 
+_ROOT_STR = str(STORAGE_ROOT)
+_ROOT_PREFIX = _ROOT_STR + os.sep
+_ROOT_LEN = len(_ROOT_PREFIX)
+
+def _rel_to_root(path) -> str:
+    # cheap replacement for Path.relative_to(STORAGE_ROOT): containment is
+    # already guaranteed by _safe_join, so a slice is enough
+    return str(path)[_ROOT_LEN:]
+
+@lru_cache(maxsize=4096)
+def _norm_path(rel_path: str) -> Path:
+    """Pure string -> Path mapping for a client-supplied relative path.
+
+    normpath collapses '.'/'..' in-string; anchoring at '/' first means
+    '..' can never climb above the root before we strip it, so the result
+    is under STORAGE_ROOT by construction. No filesystem state is touched,
+    which is what makes the lru_cache safe — the UI re-requests the same
+    hot directories every few seconds and this skips the normpath + Path
+    construction for them entirely.
+    """
+    norm = os.path.normpath('/' + (rel_path or '').lstrip('/')).lstrip('/')
+    return Path(_ROOT_PREFIX + norm) if norm else STORAGE_ROOT
+
 def _safe_join(rel_path: str) -> Path:
-    rel_path = (rel_path or '').lstrip('/')
-    p = (STORAGE_ROOT / rel_path).resolve()
-    if not str(p).startswith(str(STORAGE_ROOT)):
+    p = _norm_path(rel_path or '')
+    # the string check can't see symlinks anywhere along the path, and
+    # out-of-band writers (smbd etc.) can plant one under the root — so
+    # containment must be verified on the fully resolved path, not just
+    # when the leaf itself is a link
+    rp = os.path.realpath(p)
+    if rp != _ROOT_STR and not rp.startswith(_ROOT_PREFIX):
         abort(400, 'Path escapes storage root')
     return p
 
+def _send_attachment(p: Path):
+    """Download response for a file under STORAGE_ROOT.
+
+    With USE_XSENDFILE the proxy does a zero-copy sendfile straight from
+    disk; otherwise Flask streams it (conditional=True so Range/304 work).
+    """
+    s = str(p)
+    if USE_XSENDFILE and s.startswith(_ROOT_PREFIX):
+        resp = Response(mimetype=_guess_mime(p.name) or 'application/octet-stream')
+        resp.headers['X-Accel-Redirect'] = '/_protected/' + quote(s[len(_ROOT_PREFIX):])
+        # RFC 6266: percent-escapes inside a plain filename="..." are NOT
+        # decoded by browsers, so non-ASCII names (the norm here) must ride
+        # in filename*=UTF-8''... — same as werkzeug does on the send_file path
+        if p.name.isascii() and '"' not in p.name:
+            disp = f'attachment; filename="{p.name}"'
+        else:
+            disp = f"attachment; filename*=UTF-8''{quote(p.name)}"
+        resp.headers['Content-Disposition'] = disp
+        return resp
+    resp = send_file(p, as_attachment=True, download_name=p.name, conditional=True, etag=True)
+    # players seek with Range requests; make sure nginx doesn't buffer the stream
+    resp.headers['X-Accel-Buffering'] = 'no'
+    return resp
+
 def _safe_join_download(rel_path: str) -> Path:
+    # same shape as _safe_join: string normalization first, then containment
+    # checked on the fully resolved path so a symlinked intermediate dir
+    # can't smuggle the target outside the root
     rel_path = (rel_path or '').lstrip('/')
-    p = (DOWNLOAD_ROOT / rel_path).resolve()
-    if not str(p).startswith(str(DOWNLOAD_ROOT)):
+    norm = os.path.normpath('/' + rel_path).lstrip('/')
+    p = (DOWNLOAD_ROOT / norm) if norm else DOWNLOAD_ROOT
+    rp = os.path.realpath(p)
+    if rp != _DL_ROOT_STR and not rp.startswith(_DL_ROOT_PREFIX):
         abort(400, 'Path escapes download root')
     return p
 
+# --- Directory stat fan-out ---
+_STAT_FANOUT_MIN = 64   # below this, threading overhead beats the latency win
+_STAT_CHUNK = 256
+
+def _stat_entries(entries):
+    """stat() a batch of DirEntry objects, skipping unreadable/vanished ones."""
+    out = []
+    for e in entries:
+        try:
+            out.append((e, e.stat()))
+        except (PermissionError, FileNotFoundError):
+            continue
+    return out
+
 # --- Temps & Network helpers ---
 _net_last = {"ts": None, "rx": {}, "tx": {}}
 
+# sensors and interface config move slowly — no point re-sweeping them on
+# every 2 s tick (sensors_temperatures in particular re-parses hwmon files)
+_temps_cache = {"ts": 0.0, "data": []}
+_TEMPS_TTL = 10.0
+_net_meta = {"ts": 0.0, "stats": {}, "addrs": {}}
+_NET_META_TTL = 30.0  # link state/addresses barely change; rates stay per-tick
+# exclude loopback & obvious virtuals
+_NET_SKIP_PREFIXES = ("lo", "docker", "veth", "br-", "virbr", "vmnet", "zt")
+# interfaces that survive the prefix filter; rebuilt with the meta refresh
+# so the per-tick loop doesn't rerun six startswith checks per interface
+_NET_KEEP = set()
+
 def _get_temps():
+    now = time.monotonic()
+    if now - _temps_cache["ts"] < _TEMPS_TTL:
+        return _temps_cache["data"]
     out = []
     try:
         temps = psutil.sensors_temperatures(fahrenheit=False) or {}
@@ -283,60 +596,57 @@ def _get_temps():
                 })
     except Exception:
         pass
+    _temps_cache["ts"] = now
+    _temps_cache["data"] = out
     return out
 
 def _get_net():
     """Return per-interface link state, ip, speed(Mbps), and rx/tx rates (bytes/s)."""
     now = time.time()
-    stats = psutil.net_if_stats() or {}
-    addrs = psutil.net_if_addrs() or {}
+    now_m = time.monotonic()
+    if now_m - _net_meta["ts"] >= _NET_META_TTL:
+        _net_meta["stats"] = psutil.net_if_stats() or {}
+        _net_meta["addrs"] = psutil.net_if_addrs() or {}
+        _net_meta["ts"] = now_m
+        _NET_KEEP.clear()
+        _NET_KEEP.update(n for n in _net_meta["stats"]
+                         if not n.lower().startswith(_NET_SKIP_PREFIXES))
+    stats = _net_meta["stats"]
+    addrs = _net_meta["addrs"]
     io = psutil.net_io_counters(pernic=True) or {}
 
-    # exclude loopback & obvious virtuals
-    def _skip(name):
-        n = name.lower()
-        return n.startswith(("lo", "docker", "veth", "br-", "virbr", "vmnet", "zt"))
-
-    # compute rates
+    # one pass over the stable keep-set: compute rates and update the
+    # previous-counter dicts in place instead of rebuilding them per tick
     dt = (now - (_net_last["ts"] or now)) or 1.0
-    rates = {}
-    for name, c in io.items():
-        rx_prev = _net_last["rx"].get(name, c.bytes_recv)
-        tx_prev = _net_last["tx"].get(name, c.bytes_sent)
-        rates[name] = {
-            "rx_bps": max(0, (c.bytes_recv - rx_prev) / dt),
-            "tx_bps": max(0, (c.bytes_sent - tx_prev) / dt),
-            "bytes_recv": c.bytes_recv,
-            "bytes_sent": c.bytes_sent,
-        }
-    # update cache
-    _net_last["ts"] = now
-    _net_last["rx"] = {n: io[n].bytes_recv for n in io}
-    _net_last["tx"] = {n: io[n].bytes_sent for n in io}
-
+    rx_prev, tx_prev = _net_last["rx"], _net_last["tx"]
     out = {}
-    for name, st in stats.items():
-        if _skip(name):
+    for name in _NET_KEEP:
+        st = stats.get(name)
+        if st is None:
             continue
+        c = io.get(name)
+        if c is not None:
+            rx_bps = max(0, (c.bytes_recv - rx_prev.get(name, c.bytes_recv)) / dt)
+            tx_bps = max(0, (c.bytes_sent - tx_prev.get(name, c.bytes_sent)) / dt)
+            rx_prev[name] = c.bytes_recv
+            tx_prev[name] = c.bytes_sent
+        else:
+            rx_bps = tx_bps = 0.0
         ip = None
-        if name in addrs:
-            for a in addrs[name]:
-                if getattr(a, "family", None).__class__.__name__ == "AddressFamily":
-                    # psutil >= 5.9
-                    fam = a.family.name
-                else:
-                    fam = str(a.family)
-                if "AF_INET" in fam:
-                    ip = a.address
-                    break
-        rate = rates.get(name, {})
+        for a in addrs.get(name, ()):
+            # AF_INET compares fine against psutil's AddressFamily enum —
+            # no name/introspection dance needed
+            if a.family == socket.AF_INET:
+                ip = a.address
+                break
         out[name] = {
             "isup": bool(st.isup),
             "speed_mbps": int(st.speed) if st.speed else None,
             "ip": ip,
-            "rx_bps": rate.get("rx_bps", 0.0),
-            "tx_bps": rate.get("tx_bps", 0.0),
+            "rx_bps": rx_bps,
+            "tx_bps": tx_bps,
         }
+    _net_last["ts"] = now
     return out
 
 
@@ -344,20 +654,69 @@ def _get_net():
 ARIA2_RPC_URL    = os.getenv('ARIA2_RPC_URL', 'http://host.docker.internal:6800/jsonrpc')
 ARIA2_RPC_SECRET = os.getenv('ARIA2_RPC_SECRET', '')  # matches rpc-secret in aria2.conf
 DOWNLOAD_ROOT    = Path(os.getenv('DOWNLOAD_ROOT', '/mnt/drive')).resolve()
+_DL_ROOT_STR = str(DOWNLOAD_ROOT)
+_DL_ROOT_PREFIX = _DL_ROOT_STR + os.sep
 
 # ==================== Aria2 RPC ====================
+# urllib.request opened (and tore down) a fresh TCP connection per RPC —
+# three handshakes every poll tick. Keep one connection per greenlet warm.
+_ARIA2_URL = urlsplit(ARIA2_RPC_URL)
+_aria2_local = threading.local()
+
+def _aria2_request(data: bytes) -> bytes:
+    for retry in (True, False):
+        conn = getattr(_aria2_local, 'conn', None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if _ARIA2_URL.scheme == 'https' else http.client.HTTPConnection
+            conn = cls(_ARIA2_URL.hostname, _ARIA2_URL.port, timeout=10)
+            _aria2_local.conn = conn
+        try:
+            conn.request('POST', _ARIA2_URL.path or '/jsonrpc', data,
+                         {'Content-Type': 'application/json'})
+            return conn.getresponse().read()
+        except (http.client.HTTPException, OSError):
+            # stale keep-alive or aria2 restart: reconnect once, then give up
+            conn.close()
+            _aria2_local.conn = None
+            if not retry:
+                raise
+
 def _aria2_call(method, params=None):
     payload = {"jsonrpc": "2.0", "id": "koala", "method": method, "params": params or []}
-    if ARIA2_RPC_SECRET:
+    # system.multicall carries the token inside each nested call instead
+    if ARIA2_RPC_SECRET and method != "system.multicall":
         payload["params"].insert(0, f"token:{ARIA2_RPC_SECRET}")
-    data = json.dumps(payload).encode()
-    req = urllib.request.Request(ARIA2_RPC_URL, data=data, headers={"Content-Type": "application/json"})
-    with urllib.request.urlopen(req, timeout=10) as r:
-        return json.loads(r.read().decode())
+    # tellStopped responses carry hundreds of entries with files/bittorrent
+    # sub-trees — decode them with orjson when we have it
+    data = orjson.dumps(payload) if orjson is not None else json.dumps(payload).encode()
+    body = _aria2_request(data)
+    return orjson.loads(body) if orjson is not None else json.loads(body.decode())
+def _aria2_multicall(calls):
+    """Run several aria2 methods in one system.multicall round trip.
+
+    `calls` is a list of (method, params) pairs; returns one unwrapped
+    result list per call (empty list for a faulted sub-call).
+    """
+    wrapped = []
+    for method, params in calls:
+        params = list(params)
+        if ARIA2_RPC_SECRET:
+            params.insert(0, f"token:{ARIA2_RPC_SECRET}")
+        wrapped.append({"methodName": method, "params": params})
+    results = _aria2_call("system.multicall", [wrapped]).get("result", [])
+    # success entries come back as [value]; faults as {'code':..,'message':..}
+    return [r[0] if isinstance(r, list) else [] for r in results]
+
 # ==================== Static files ====================
 @app.route('/manifest.json')
 def manifest():
-    return send_file('static/manifest.json', mimetype='application/manifest+json')
+    # conditional + max_age turns repeat hits into 304s (which Cloudflare
+    # can then answer at the edge) instead of re-reading the file
+    resp = send_from_directory(app.static_folder, 'manifest.json',
+                               mimetype='application/manifest+json',
+                               max_age=86400, conditional=True)
+    resp.headers['Cache-Control'] = 'public, max-age=86400'
+    return resp
 # ==================== yt-dlp helper ====================
 def run_youtubedl(url, dest_path, audio_only=True):
     try:
@@ -401,58 +760,77 @@ def _infer_name(files, bt):
         pass
     try:
         if files:
-            parts = [Path(f.get("path", "")).parts for f in files if f.get("path")]
-            if parts:
-                common = []
-                for tup in zip(*parts):
-                    if all(seg == tup[0] for seg in tup):
-                        common.append(tup[0])
-                    else:
-                        break
-                if common:
-                    p = Path(*common)
-                    return p.name or Path(files[0].get("path", "")).name
+            paths = [f["path"] for f in files if f.get("path")]
+            if len(paths) == 1:
+                return os.path.basename(paths[0])
+            if paths:
+                # C-implemented commonpath instead of transposing parts tuples
+                common = os.path.commonpath(paths)
+                return os.path.basename(common) or os.path.basename(paths[0])
             return Path(files[0].get("path", "")).name
     except Exception:
         pass
     return "(unknown)"
 
+_NAME_CACHE = {}  # gid -> inferred display name (names never change)
+
+def _torrent_name(gid, files, bt):
+    if gid:
+        cached = _NAME_CACHE.get(gid)
+        if cached is not None:
+            return cached
+    name = _infer_name(files, bt)
+    if gid:
+        if len(_NAME_CACHE) > 2048:  # bound growth across long sessions
+            _NAME_CACHE.clear()
+        _NAME_CACHE[gid] = name
+    return name
+
 def _record_history(rows):
     """Insert completed torrents into torrent_history once."""
     if not rows:
         return
-    with sqlite3.connect(DB_PATH) as conn:
-        for t in rows:
-            gid   = t.get("gid")
-            bt    = t.get("bittorrent") or {}
-            files = t.get("files") or []
-            name  = _infer_name(files, bt)
-            total = int(t.get("totalLength") or 0)
-
-            # derive destination (parent dir of first file under DOWNLOAD_ROOT)
-            dest = "/"
-            try:
-                if files:
-                    p0 = Path(files[0]["path"])
-                    if str(p0).startswith(str(DOWNLOAD_ROOT)):
-                        dest = "/" + str(p0.parent.relative_to(DOWNLOAD_ROOT)).strip("/")
-            except Exception:
-                pass
+    ts = int(time.time())
+    batch = []
+    for t in rows:
+        gid   = t.get("gid")
+        bt    = t.get("bittorrent") or {}
+        files = t.get("files") or []
+        name  = _torrent_name(gid, files, bt)
+        total = int(t.get("totalLength") or 0)
+
+        # derive destination (parent dir of first file under DOWNLOAD_ROOT)
+        dest = "/"
+        try:
+            if files:
+                p0 = Path(files[0]["path"])
+                if str(p0).startswith(str(DOWNLOAD_ROOT)):
+                    dest = "/" + str(p0.parent.relative_to(DOWNLOAD_ROOT)).strip("/")
+        except Exception:
+            pass
+
+        batch.append((name, gid, dest, total, ts, ts))
 
-            ts = int(time.time())
-            # avoid duplicates by gid
-            cur = conn.execute("SELECT 1 FROM torrent_history WHERE gid=? LIMIT 1", (gid,))
-            if not cur.fetchone():
-                conn.execute(
-                    """INSERT INTO torrent_history(name, gid, dest, size_bytes, added_at, completed_at)
-                       VALUES (?,?,?,?,?,?)""",
-                    (name, gid, dest, total, ts, ts)
-                )
-        conn.commit()
+    # the UNIQUE index on gid makes dedup the DB's job — no per-row SELECT
+    # probe — and one explicit transaction means one WAL flush per tick
+    with _DB_LOCK:
+        try:
+            _DB.execute("BEGIN IMMEDIATE")
+            _DB.executemany(
+                """INSERT OR IGNORE INTO torrent_history(name, gid, dest, size_bytes, added_at, completed_at)
+                   VALUES (?,?,?,?,?,?)""",
+                batch
+            )
+            _DB.execute("COMMIT")
+        except Exception:
+            _DB.execute("ROLLBACK")
+            raise
 
 def get_system_stats():
     try:
-        cpu = psutil.cpu_percent(interval=0.5)
+        # interval=None returns the delta since the previous call instead of
+        # blocking the greenlet for half a second; _stats_task primes it once.
+        cpu = psutil.cpu_percent(interval=None)
         mem = psutil.virtual_memory().percent
         return {
             'cpu_percent': float(cpu),
@@ -470,127 +848,227 @@ def get_system_stats():
             'net': {},
         }
 
-def _stats_task():
-    app.logger.info("Starting system stats background task.")
-    while True:
-        try:
+def _stats_tick():
+    stats = {}
+    try:
+        # don't burn syscalls or broadcast into the void when idle,
+        # unless the watchdog needs the readings anyway
+        if _WS_CLIENTS or REBOOT_ON_FAILURES:
             stats = get_system_stats()
+        if _WS_CLIENTS:
             socketio.emit('system_stats', stats)
-            
-        except Exception as e:
-            app.logger.error(f"Error in stats task: {e}", exc_info=True)
-
-        if REBOOT_ON_FAILURES:
-            # 1. Check temperature
-            try:
-                for temp in stats.get('temps', []):
-                    if temp.get('current') is not None and temp['current'] > CRITICAL_TEMP:
-                        print(f"--- CRITICAL: Temperature {temp['label']} at {temp['current']}°C. REBOOTING. ---")
-                        _run_host_cmd(['systemctl', 'reboot']) 
-                        break # Reboot command sent, break inner loop
-            except Exception as e:
-                print(f"Error checking temps for reboot: {e}")
-
-            # 2. Check network interface
-            try:
-                if WATCH_NET_IFACE:
-                    net_stats = stats.get('net', {})
-                    # Check if the watched interface exists AND its 'isup' state is False
-                    if WATCH_NET_IFACE in net_stats and not net_stats[WATCH_NET_IFACE].get('isup'):
-                        print(f"--- CRITICAL: Network iface {WATCH_NET_IFACE} is DOWN. REBOOTING. ---")
-                        _run_host_cmd(['systemctl', 'reboot'])
-            except Exception as e:
-                print(f"Error checking net for reboot: {e}")
 
-        socketio.sleep(2)
+    except Exception as e:
+        app.logger.error(f"Error in stats task: {e}", exc_info=True)
 
-def _torrent_task():
-    # Emit only "in-progress" items (active + waiting/metadata).
-    # Completed items are written to history and not shown in progress.
-    while True:
+    if REBOOT_ON_FAILURES:
+        # 1. Check temperature
         try:
-            # ask aria2 for richer fields incl. bittorrent (for proper names)
-            fields = ["gid","status","totalLength","completedLength","downloadSpeed","files","bittorrent"]
-
-            active  = _aria2_call("aria2.tellActive",   [fields]).get("result", [])
-            waiting = _aria2_call("aria2.tellWaiting",  [0, 100, fields]).get("result", [])
-            stopped = _aria2_call("aria2.tellStopped",  [0, 100, fields]).get("result", [])
-
-            def enrich(row):
-                row = dict(row)
-                row["name"] = _infer_name(row.get("files") or [], row.get("bittorrent") or {})
-                total = int(row.get("totalLength") or 0)
-                row["isMetadata"] = (total == 0)   # show “Fetching metadata…” in UI when true
-                return row
+            for temp in stats.get('temps', []):
+                if temp.get('current') is not None and temp['current'] > CRITICAL_TEMP:
+                    print(f"--- CRITICAL: Temperature {temp['label']} at {temp['current']}°C. REBOOTING. ---")
+                    _run_host_cmd(['systemctl', 'reboot'])
+                    break # Reboot command sent, break inner loop
+        except Exception as e:
+            print(f"Error checking temps for reboot: {e}")
 
-            # progress list = active + waiting/paused (NOT including 'complete' or 'error')
-            progress = [enrich(r) for r in (active + waiting) if r.get("status") in ("active","waiting","paused")]
+        # 2. Check network interface
+        try:
+            if WATCH_NET_IFACE:
+                net_stats = stats.get('net', {})
+                # Check if the watched interface exists AND its 'isup' state is False
+                if WATCH_NET_IFACE in net_stats and not net_stats[WATCH_NET_IFACE].get('isup'):
+                    print(f"--- CRITICAL: Network iface {WATCH_NET_IFACE} is DOWN. REBOOTING. ---")
+                    _run_host_cmd(['systemctl', 'reboot'])
+        except Exception as e:
+            print(f"Error checking net for reboot: {e}")
 
-            # completed -> to history (once) and do not include in progress
-            completed_rows = [enrich(r) for r in stopped if r.get("status") == "complete"]
-            if completed_rows:
-                _record_history(completed_rows)
+_RECORDED_GIDS = set()  # completions already written to history this run
+_LAST_NUM_STOPPED = -1  # numStoppedTotal at the last stopped-list read (-1 = never)
 
+def _torrent_tick():
+    # Emit only "in-progress" items (active + waiting/metadata).
+    # Completed items are written to history and not shown in progress.
+    global _LAST_NUM_STOPPED
+    try:
+        # ask aria2 for richer fields incl. bittorrent (for proper names)
+        fields = ["gid","status","totalLength","completedLength","downloadSpeed","files","bittorrent"]
+
+        # one HTTP round trip instead of three sequential POSTs; new
+        # completions land at the *tail* of aria2's stopped list (offset 0
+        # is the oldest result), so a fixed head page goes blind once old
+        # results pile up — watch getGlobalStat's numStoppedTotal instead
+        # and re-read the list only when it moves. Not numStopped: that one
+        # is capped at --max-download-result, pegs once the list saturates
+        # (and can stand still when a remove and a completion land in the
+        # same window), while numStoppedTotal is monotonic for the session
+        active, waiting, gstat = _aria2_multicall([
+            ("aria2.tellActive",   [fields]),
+            ("aria2.tellWaiting",  [0, 100, fields]),
+            ("aria2.getGlobalStat", []),
+        ])
+        stopped = []
+        num_stopped = int(gstat.get("numStoppedTotal", 0)) if isinstance(gstat, dict) else 0
+        if num_stopped != _LAST_NUM_STOPPED:
+            stopped = _aria2_call("aria2.tellStopped", [0, 1000, fields]).get("result", [])
+            _LAST_NUM_STOPPED = num_stopped
+
+        def enrich(row):
+            row = dict(row)
+            row["name"] = _torrent_name(row.get("gid"), row.get("files") or [], row.get("bittorrent") or {})
+            total = int(row.get("totalLength") or 0)
+            row["isMetadata"] = (total == 0)   # show “Fetching metadata…” in UI when true
+            return row
+
+        # progress list = active + waiting/paused (NOT including 'complete' or 'error')
+        progress = [enrich(r) for r in (active + waiting) if r.get("status") in ("active","waiting","paused")]
+
+        # completed -> to history (once) and do not include in progress
+        completed_rows = [enrich(r) for r in stopped
+                          if r.get("status") == "complete" and r.get("gid") not in _RECORDED_GIDS]
+        if completed_rows:
+            _record_history(completed_rows)
+            _RECORDED_GIDS.update(r["gid"] for r in completed_rows if r.get("gid"))
+
+        if _WS_CLIENTS:
             socketio.emit("torrent_status", {"progress": progress})
-        except Exception:
-            # don’t crash the loop on transient RPC errors
-            pass
-        socketio.sleep(2)
+    except Exception:
+        # don’t crash the tick on transient RPC errors
+        pass
 
-_started = False
-@app.before_request
-def _start_tasks_once():
-    global _started
-    if not _started:
-        socketio.start_background_task(_stats_task)
-        socketio.start_background_task(_torrent_task)
-        _started = True
+def _combined_task():
+    """One greenlet drives both emitters: stats every 2s tick, aria2 every
+    tick while someone is watching and every 4th (~8s) when idle so
+    completions still land in history."""
+    app.logger.info("Starting combined stats/torrent background task.")
+    psutil.cpu_percent(interval=None)  # arm the non-blocking sampler
+    next_tick = time.monotonic()
+    tick = 0
+    while True:
+        _stats_tick()
+        if _WS_CLIENTS or tick % 4 == 0:
+            _torrent_tick()
+        tick += 1
+        # sleep to the next 2 s boundary so the tick doesn't drift
+        next_tick += 2.0
+        socketio.sleep(max(0.0, next_tick - time.monotonic()))
+
+# Start the emitter once at import instead of checking a flag on every
+# request (which also raced under concurrent first hits).
+socketio.start_background_task(_combined_task)
 
 # ==================== DB ====================
+# One long-lived connection in autocommit mode instead of a fresh
+# sqlite3.connect per request: keeps the page cache warm between requests
+# and skips connection setup on every share lookup. WAL lets readers and
+# the writer overlap. Guarded by a lock since requests share the handle.
+_DB = None
+_DB_LOCK = threading.Lock()
+
 def _db_init():
+    global _DB
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS shares (
-                token TEXT PRIMARY KEY,
-                target_path TEXT NOT NULL,
-                is_dir INTEGER NOT NULL,
-                expires_at INTEGER,
-                created_at INTEGER NOT NULL
-            )
-        """)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS torrent_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                gid TEXT,
-                dest TEXT NOT NULL,
-                size_bytes INTEGER,
-                added_at INTEGER NOT NULL,
-                completed_at INTEGER
-            )
-        """)
-        conn.commit()
+    # explicit statement-cache size: with one long-lived connection every
+    # repeated query text stays compiled across requests
+    _DB = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None,
+                          cached_statements=256)
+    _DB.execute("PRAGMA journal_mode=WAL")
+    _DB.execute("PRAGMA synchronous=NORMAL")
+    _DB.execute("PRAGMA cache_size=-65536")
+    _DB.execute("PRAGMA temp_store=MEMORY")
+    _DB.execute("PRAGMA mmap_size=268435456")  # 256 MB — read pages straight from the page cache
+    _DB.execute("""
+        CREATE TABLE IF NOT EXISTS shares (
+            token TEXT PRIMARY KEY,
+            target_path TEXT NOT NULL,
+            is_dir INTEGER NOT NULL,
+            expires_at INTEGER,
+            created_at INTEGER NOT NULL
+        )
+    """)
+    _DB.execute("""
+        CREATE TABLE IF NOT EXISTS torrent_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            gid TEXT,
+            dest TEXT NOT NULL,
+            size_bytes INTEGER,
+            added_at INTEGER NOT NULL,
+            completed_at INTEGER
+        )
+    """)
+    _DB.execute("CREATE INDEX IF NOT EXISTS idx_shares_expires ON shares(expires_at)")
+    # matches the exact ORDER BY expression in torrents_history, so the
+    # LIMIT 500 walks the index instead of sorting the whole table
+    _DB.execute("CREATE INDEX IF NOT EXISTS idx_torrent_history_completed "
+                "ON torrent_history(COALESCE(completed_at, added_at))")
+    try:
+        _DB.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_torrent_history_gid ON torrent_history(gid)")
+    except sqlite3.IntegrityError:
+        # older installs could have recorded a gid twice; keep the first row
+        _DB.execute("DELETE FROM torrent_history WHERE id NOT IN (SELECT MIN(id) FROM torrent_history GROUP BY gid)")
+        _DB.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_torrent_history_gid ON torrent_history(gid)")
 _db_init()
 
+def _db_exec(sql, params=()):
+    """One statement on the shared connection, under the lock."""
+    with _DB_LOCK:
+        return _DB.execute(sql, params)
+
+def _db_fetchall(sql, params=()):
+    with _DB_LOCK:
+        return _DB.execute(sql, params).fetchall()
+
 # ==================== Auth ====================
+# PAM runs the full login stack (50-200 ms) per attempt, which both slows
+# legitimate re-logins and makes brute forcing cheap for us to serve.
+# Rate-limit failures per IP before touching PAM, and remember recent
+# successful credentials (keyed digest only, never the password) briefly.
+_LOGIN_FAILS = defaultdict(deque)  # remote ip -> recent failure timestamps
+_LOGIN_FAIL_MAX = 5
+_LOGIN_FAIL_WINDOW = 60.0
+_AUTH_OK_CACHE = {}                # (user, digest) -> ts of last PAM success
+_AUTH_OK_TTL = 300.0
+
+def _pw_digest(user: str, pw: str) -> bytes:
+    return hashlib.blake2b(f'{user}\x00{pw}'.encode(), digest_size=16,
+                           key=SECRET_KEY.encode()[:64]).digest()
+
 @app.post('/auth/login')
 def auth_login():
-    data = request.get_json(force=True, silent=True) or {}
+    data = request.get_json(silent=True) or {}
     user = data.get('username')
     pw = data.get('password')
     if not user or not pw:
         return jsonify({'ok': False, 'error': 'Missing credentials', 'code': 400}), 400
-    if not check_password(user, pw):
-        return jsonify({'ok': False, 'error': 'Invalid credentials', 'code': 401}), 401
+
+    now = time.time()
+    fails = _LOGIN_FAILS[request.remote_addr or '?']
+    while fails and now - fails[0] > _LOGIN_FAIL_WINDOW:
+        fails.popleft()
+    if len(fails) >= _LOGIN_FAIL_MAX:
+        return jsonify({'ok': False, 'error': 'Too many attempts, try again later', 'code': 429}), 429
+
+    cache_key = (user, _pw_digest(user, pw))
+    hit = _AUTH_OK_CACHE.get(cache_key)
+    if not (hit and now - hit < _AUTH_OK_TTL):
+        if not check_password(user, pw):
+            fails.append(now)
+            return jsonify({'ok': False, 'error': 'Invalid credentials', 'code': 401}), 401
+        _AUTH_OK_CACHE[cache_key] = now  # never cache failures
     session['logged_in'] = True
     session['user'] = user
-    return jsonify({'ok': True})
+    resp = jsonify({'ok': True})
+    resp.set_cookie(_AUTH_COOKIE, _auth_serializer.dumps(user),
+                    max_age=_AUTH_COOKIE_MAX_AGE, httponly=True, samesite='Lax')
+    return resp
 
 @app.post('/auth/logout')
 def auth_logout():
     session.clear()
-    return jsonify({'ok': True})
+    resp = jsonify({'ok': True})
+    resp.delete_cookie(_AUTH_COOKIE)
+    return resp
 
 @app.get('/auth/status')
 def auth_status():
@@ -605,10 +1083,13 @@ def admin_page():
 @auth_required_json
 def get_logs():
     try:
-        with open(LOG_PATH, 'r') as f:
-            lines = f.readlines()
-        last_100_lines = lines[-100:]
-        return jsonify({'ok': True, 'logs': "".join(last_100_lines)})
+        # read only the tail instead of materializing the whole 1 MB file
+        # as a list of lines just to throw most of them away
+        with open(LOG_PATH, 'rb') as f:
+            size = f.seek(0, os.SEEK_END)
+            f.seek(max(0, size - 16384))
+            tail = f.read().decode(errors='replace').splitlines()[-100:]
+        return jsonify({'ok': True, 'logs': "\n".join(tail)})
     except FileNotFoundError:
         return jsonify({'ok': True, 'logs': 'Log file not found.'})
     except Exception as e:
@@ -618,7 +1099,7 @@ def get_logs():
 @app.post('/admin/services/toggle')
 @auth_required_json
 def toggle_service():
-    data = request.get_json(force=True, silent=True) or {}
+    data = request.get_json(silent=True) or {}
     friendly_name = data.get('service')
     desired_state = bool(data.get('state'))
 
@@ -636,7 +1117,16 @@ def toggle_service():
 
     if service_type == 'systemd':
         action = 'start' if desired_state else 'stop'
+        if _PystemdUnit is not None and not USE_NSENTER:
+            try:
+                u = _dbus_unit(service_value)
+                u.Unit.Start(b'replace') if desired_state else u.Unit.Stop(b'replace')
+                _status_cache_invalidate(service_value)
+                return jsonify({'ok': True, 'service': friendly_name, 'status': get_systemd_service_status(service_value)})
+            except Exception as e:
+                app.logger.warning(f'pystemd {action} failed for {service_value}, falling back: {e}')
         p = _run_host_cmd(['systemctl', action, service_value])
+        _status_cache_invalidate(service_value)
         if p.returncode != 0:
             msg = (p.stderr or p.stdout).decode(errors='ignore').strip() or f'Failed to {action} {friendly_name}'
             return jsonify({'ok': False, 'error': msg}), 500
@@ -650,6 +1140,7 @@ def toggle_service():
         
         # We pass this complete command to the host's shell
         p = _run_host_cmd(['sh', '-c', shell_cmd_on_host])
+        _status_cache_invalidate(service_value)
 
         if p.returncode != 0:
             msg = (p.stderr or p.stdout).decode(errors='ignore').strip() or f'Failed to run docker compose for {friendly_name}'
@@ -662,8 +1153,15 @@ def toggle_service():
 @app.get('/admin/services/list')
 @auth_required_json
 def list_services():
+    # warm every stale systemd entry with one batched subprocess, then the
+    # loop below is all cache hits
+    stale = [d['value'] for _, d in SERVICE_ITEMS
+             if d.get('type') == 'systemd' and _status_cache_get(d['value']) is None]
+    if stale and not (_PystemdUnit is not None and not USE_NSENTER):
+        _refresh_systemd_statuses(stale)
+
     services = {}
-    for name, details in SERVICE_MAP.items():
+    for name, details in SERVICE_ITEMS:
         if details.get('type') == 'systemd':
             services[name] = get_systemd_service_status(details['value'])
         elif details.get('type') == 'docker':
@@ -674,14 +1172,26 @@ def list_services():
     services['drive'] = DRIVE_ENABLED
     return jsonify({'ok': True, 'services': services})
 
+# disk usage barely moves between dashboard polls; don't statvfs every hit
+_USAGE_CACHE = {}  # mountpoint -> (ts, entry dict)
+_USAGE_TTL = 5.0
+
+def _disk_usage_cached(mountpoint: str):
+    hit = _USAGE_CACHE.get(mountpoint)
+    if hit and (time.time() - hit[0]) < _USAGE_TTL:
+        return hit[1]
+    u = psutil.disk_usage(mountpoint)
+    entry = {'mountpoint': mountpoint, 'total': u.total, 'used': u.used, 'percent': u.percent}
+    _USAGE_CACHE[mountpoint] = (time.time(), entry)
+    return entry
+
 @app.get('/admin/storage')
 @auth_required_json
 def storage_api():
     out = []
     for m in DASH_MOUNTS:
         try:
-            u = psutil.disk_usage(str(m))
-            out.append({'mountpoint': str(m), 'total': u.total, 'used': u.used, 'percent': u.percent})
+            out.append(_disk_usage_cached(str(m)))
         except Exception:
             continue
     return jsonify({'ok': True, 'storage': out})
@@ -714,17 +1224,30 @@ def api_list():
     if p.is_file():
         st = p.stat()
         return jsonify({'ok': True, 'type': 'file', 'name': p.name,
-                        'path': str(p.relative_to(STORAGE_ROOT)), 'size': st.st_size, 'mtime': int(st.st_mtime)})
-    items = []
-    for c in sorted(p.iterdir(), key=lambda x: (x.is_file(), x.name.lower())):
-        try:
-            st = c.stat()
-            items.append({'name': c.name, 'path': str(c.relative_to(STORAGE_ROOT)),
-                          'type': 'file' if c.is_file() else 'dir',
-                          'size': st.st_size, 'mtime': int(st.st_mtime)})
-        except PermissionError:
-            continue
-    return jsonify({'ok': True, 'type': 'dir', 'path': '/' if p == STORAGE_ROOT else str(p.relative_to(STORAGE_ROOT)), 'items': items})
+                        'path': _rel_to_root(p), 'size': st.st_size, 'mtime': int(st.st_mtime)})
+    # scandir reuses the metadata the kernel already returned with the
+    # directory entries, instead of a fresh stat per child like iterdir
+    with os.scandir(p) as it:
+        # key runs once per entry: is_file reads the cached d_type and
+        # casefold is the Unicode-correct (and no slower) case for sorting
+        entries = sorted(it, key=lambda e: (e.is_file(follow_symlinks=False),
+                                            e.name.casefold()))
+    if p == STORAGE_ROOT:
+        entries = [e for e in entries if e.name not in ('.trash', '.upload_tmp')]  # internal dirs
+    if len(entries) > _STAT_FANOUT_MIN:
+        # big dirs on slow/remote mounts: run stat() batches on real OS
+        # threads (tpool) so per-entry latency overlaps instead of adding up,
+        # and the event loop stays free for other requests
+        chunks = [entries[i:i + _STAT_CHUNK] for i in range(0, len(entries), _STAT_CHUNK)]
+        threads = [eventlet.spawn(tpool.execute, _stat_entries, c) for c in chunks]
+        pairs = [pe for t in threads for pe in t.wait()]
+    else:
+        pairs = _stat_entries(entries)
+    items = [{'name': e.name, 'path': e.path[_ROOT_LEN:],
+              'type': 'file' if e.is_file() else 'dir',
+              'size': st.st_size, 'mtime': int(st.st_mtime)}
+             for e, st in pairs]
+    return _json({'ok': True, 'type': 'dir', 'path': '/' if p == STORAGE_ROOT else _rel_to_root(p), 'items': items})
 
 @app.get('/api/download')
 @auth_required_json
@@ -733,12 +1256,12 @@ def api_download():
     p = _safe_join(rel)
     if not p.exists() or not p.is_file():
         abort(404)
-    return send_file(p, as_attachment=True, download_name=p.name)
+    return _send_attachment(p)
 
 @app.post('/api/upload')
 @auth_required_json
 def api_upload():
-    rel = request.args.get('path', '').strip() or str(DEFAULT_UPLOAD_DIR.relative_to(STORAGE_ROOT))
+    rel = request.args.get('path', '').strip() or _rel_to_root(DEFAULT_UPLOAD_DIR)
     target_dir = _safe_join(rel)
     target_dir.mkdir(parents=True, exist_ok=True)
     if 'file' not in request.files:
@@ -750,8 +1273,18 @@ def api_upload():
         abort(400, 'File type not allowed')
     name = os.path.basename(f.filename)
     dest = target_dir / name
-    f.save(dest)
-    return jsonify({'ok': True, 'saved_as': str(dest.relative_to(STORAGE_ROOT))})
+    tmp_name = getattr(f.stream, 'name', None)
+    if isinstance(tmp_name, str) and os.path.exists(tmp_name):
+        # the parser already streamed the part to .upload_tmp on this
+        # filesystem — a rename moves it into place without re-copying
+        f.stream.close()
+        os.replace(tmp_name, dest)
+    else:
+        # in-memory or foreign stream: copy with a 4 MiB buffer (FileStorage
+        # .save would use 16 KB chunks)
+        with open(dest, 'wb') as out:
+            shutil.copyfileobj(f.stream, out, length=4 * 1024 * 1024)
+    return jsonify({'ok': True, 'saved_as': _rel_to_root(dest)})
 
 @app.post('/api/mkdir')
 @auth_required_json
@@ -772,7 +1305,13 @@ def api_delete():
     if not p.exists():
         abort(404)
     if p.is_dir():
-        shutil.rmtree(p)
+        # rmtree on a big tree blocks the worker for seconds; rename is one
+        # syscall, then a real OS thread grinds through the unlinks (a bare
+        # greenlet wouldn't help — unlink/scandir never yield to the hub)
+        trash = STORAGE_ROOT / '.trash' / uuid4().hex
+        trash.parent.mkdir(exist_ok=True)
+        os.rename(p, trash)
+        socketio.start_background_task(tpool.execute, shutil.rmtree, trash, ignore_errors=True)
     else:
         p.unlink()
     return jsonify({'ok': True})
@@ -795,9 +1334,9 @@ def api_copy():
     if not src.exists():
         abort(404, 'src missing')
     if src.is_dir():
-        shutil.copytree(src, dst)
+        shutil.copytree(src, dst, copy_function=_fast_copy)
     else:
-        shutil.copy2(src, dst)
+        _fast_copy(src, dst)
     return jsonify({'ok': True})
 
 @app.get('/api/properties')
@@ -809,16 +1348,16 @@ def api_properties():
         abort(404)
     st = p.stat()
     kind = 'file' if p.is_file() else 'dir'
-    mime = mimetypes.guess_type(p.name)[0] if p.is_file() else 'inode/directory'
+    mime = _guess_mime(p.name) if p.is_file() else 'inode/directory'
     return jsonify({'ok': True, 'type': kind, 'name': p.name,
-                    'path': str(p.relative_to(STORAGE_ROOT)), 'size': st.st_size,
+                    'path': _rel_to_root(p), 'size': st.st_size,
                     'mtime': int(st.st_mtime), 'mime': mime})
 
 # ==================== Torrent APIs ====================
 @app.post('/admin/torrents/add')
 @auth_required_json
 def torrents_add():
-    data = request.get_json(force=True, silent=True) or {}
+    data = request.get_json(silent=True) or {}
     magnet = (data.get('link') or '').strip()
     dest   = (data.get('dest') or '').strip()
     if not magnet:
@@ -831,7 +1370,7 @@ def torrents_add():
 @app.post('/admin/torrents/remove')
 @auth_required_json
 def torrents_remove():
-    data = request.get_json(force=True, silent=True) or {}
+    data = request.get_json(silent=True) or {}
     gid = data.get('gid')
     if not gid:
         abort(400, 'Missing gid')
@@ -848,27 +1387,25 @@ def torrents_remove():
 @app.get('/admin/torrents/history')
 @auth_required_json
 def torrents_history():
-    with sqlite3.connect(DB_PATH) as conn:
-        rows = conn.execute("""
-            SELECT id, name, gid, dest, size_bytes, added_at, completed_at
-            FROM torrent_history ORDER BY COALESCE(completed_at, added_at) DESC LIMIT 500
-        """).fetchall()
-    out = []
-    for r in rows:
-        out.append({'id': r[0], 'name': r[1], 'gid': r[2], 'dest': r[3],
-                    'size_bytes': r[4], 'added_at': r[5], 'completed_at': r[6]})
+    rows = _db_fetchall("""
+        SELECT id, name, gid, dest, size_bytes, added_at, completed_at
+        FROM torrent_history ORDER BY COALESCE(completed_at, added_at) DESC LIMIT 500
+    """)
+    # one comprehension instead of append-per-row; jsonify hands the result
+    # to the orjson provider, so no stdlib json in this path
+    out = [{'id': r[0], 'name': r[1], 'gid': r[2], 'dest': r[3],
+            'size_bytes': r[4], 'added_at': r[5], 'completed_at': r[6]}
+           for r in rows]
     return jsonify({'ok': True, 'history': out})
 
 @app.post('/admin/torrents/history/delete')
 @auth_required_json
 def torrents_history_delete():
-    data = request.get_json(force=True, silent=True) or {}
+    data = request.get_json(silent=True) or {}
     hid = data.get('id')
     if hid is None:
         abort(400, 'Missing history id')
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("DELETE FROM torrent_history WHERE id=?", (hid,))
-        conn.commit()
+    _db_exec("DELETE FROM torrent_history WHERE id=?", (hid,))
     return jsonify({'ok': True})
 
 @app.get('/admin/torrents/browse')
@@ -881,10 +1418,11 @@ def torrents_browse():
     if p.is_file():
         abort(400, 'Not a directory')
 
-    items = []
-    for c in sorted(p.iterdir(), key=lambda x: (x.is_file(), x.name.lower())):
-        if c.is_dir():
-            items.append({'name': c.name, 'path': str(c.relative_to(DOWNLOAD_ROOT))})
+    # only directories are shown here; DirEntry.is_dir reads the d_type the
+    # kernel already returned, so this costs no stat at all
+    with os.scandir(p) as it:
+        dirs = sorted((e for e in it if e.is_dir()), key=lambda e: e.name.casefold())
+    items = [{'name': e.name, 'path': str(Path(e.path).relative_to(DOWNLOAD_ROOT))} for e in dirs]
 
     parent_rel = '' if p == DOWNLOAD_ROOT else str(p.parent.relative_to(DOWNLOAD_ROOT))
     return jsonify({
@@ -909,7 +1447,7 @@ def torrents_mkdir():
 @app.post('/admin/youtubedl/add')
 @auth_required_json
 def youtubedl_add():
-    data = request.get_json(force=True, silent=True) or {}
+    data = request.get_json(silent=True) or {}
     link = (data.get('link') or '').strip()
     dest = (data.get('dest') or '').strip()
     audio_only = bool(data.get('audio_only', False))
@@ -925,29 +1463,103 @@ def youtubedl_add():
 
 
 # ==================== Public share endpoints (no auth) ====================
+_SHARE_LOOKUP_SQL = 'SELECT token, target_path, is_dir, expires_at FROM shares WHERE token=?'
+
+# compiled once at import; rendering emits straight into Jinja's buffer
+# instead of a list-of-strings + join per request (and auto-escapes names)
+_SHARE_TPL = app.jinja_env.from_string("""\
+<h3>Shared folder: /{{ root_name }}{% if rel %}/{{ rel }}{% endif %}</h3>
+{% if rel %}<p><a href="/s/{{ token }}{{ parent_q }}">⬅️ Up</a></p>{% endif %}
+<ul>
+{% for it in items %}\
+{% if it.type == 'dir' %}<li>📁 <a href="{{ it.href }}">{{ it.name }}</a></li>
+{% else %}<li>📄 <a href="{{ it.href }}">{{ it.name }}</a> — <a href="{{ it.href }}">download</a></li>
+{% endif %}\
+{% endfor %}\
+</ul>""")
+
+@lru_cache(maxsize=1024)
+def _resolved_share_base(target_path: str) -> str:
+    # a share's target never moves once created — resolve it once per target
+    # instead of walking/statting every path component on each /s/ hit
+    return os.path.realpath(target_path)
+
+@lru_cache(maxsize=1024)
+def _lookup_share(token):
+    """Share rows are immutable once inserted, so repeat hits on the same
+    link (the common case for a shared folder) skip sqlite entirely.
+    Expiry is checked by the caller, not cached here."""
+    rows = _db_fetchall(_SHARE_LOOKUP_SQL, (token,))
+    return rows[0] if rows else None
+
+def _purge_expired_shares():
+    """Drop expired share rows so the table (and every token lookup) doesn't
+    grow for the lifetime of the install."""
+    while True:
+        try:
+            cur = _db_exec(
+                "DELETE FROM shares WHERE expires_at IS NOT NULL AND expires_at < ?",
+                (int(time.time()),))
+            if cur.rowcount:
+                _lookup_share.cache_clear()
+                app.logger.info(f'Purged {cur.rowcount} expired share link(s)')
+        except Exception as e:
+            app.logger.error(f'Share purge failed: {e}')
+        socketio.sleep(300)
+
+socketio.start_background_task(_purge_expired_shares)
+
+# keep a pool of pre-generated tokens so share creation doesn't pay the
+# getrandom(2) + base64 work per request; refilled off the request path
+_TOKEN_POOL = deque()
+_TOKEN_POOL_SIZE = 256
+
+def _refill_token_pool():
+    while True:
+        while len(_TOKEN_POOL) < _TOKEN_POOL_SIZE:
+            _TOKEN_POOL.append(secrets.token_urlsafe(16))
+        socketio.sleep(5)
+
+socketio.start_background_task(_refill_token_pool)
+
+def _next_token():
+    try:
+        return _TOKEN_POOL.popleft()
+    except IndexError:  # pool drained faster than the refill — fall back
+        return secrets.token_urlsafe(16)
+
 @app.post('/api/share')
 @auth_required_json
 def api_share():
-    rel = request.json.get('path', '').strip()
+    # single 'path' (the UI) or a 'paths' list for bulk sharing
+    paths = request.json.get('paths')
+    single = paths is None
+    if single:
+        paths = [request.json.get('path', '')]
     hours = float(request.json.get('expires_hours', 0))
-    target = _safe_join(rel)
-    if not target.exists():
-        abort(404)
-    token = secrets.token_urlsafe(16)
-    is_dir = 1 if target.is_dir() else 0
-    expires_at = int(time.time() + hours * 3600) if hours > 0 else None
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute(
+    now = int(time.time())
+    expires_at = int(now + hours * 3600) if hours > 0 else None
+    rows, out = [], []
+    for rel in paths:
+        target = _safe_join((rel or '').strip())
+        if not target.exists():
+            abort(404)
+        token = _next_token()
+        rows.append((token, str(target), 1 if target.is_dir() else 0, expires_at, now))
+        out.append({'token': token, 'url': f'/s/{token}'})
+    with _DB_LOCK:
+        _DB.executemany(
             'INSERT INTO shares(token, target_path, is_dir, expires_at, created_at) VALUES (?,?,?,?,?)',
-            (token, str(target), is_dir, expires_at, int(time.time()))
+            rows
         )
-        conn.commit()
-    return jsonify({'ok': True, 'token': token, 'url': f'/s/{token}'})
+    _lookup_share.cache_clear()
+    if single:
+        return jsonify({'ok': True, 'token': out[0]['token'], 'url': out[0]['url']})
+    return jsonify({'ok': True, 'shares': out})
 
 @app.get('/s/<token>')
 def shared_entry(token):
-    with sqlite3.connect(DB_PATH) as conn:
-        row = conn.execute('SELECT token, target_path, is_dir, expires_at FROM shares WHERE token=?', (token,)).fetchone()
+    row = _lookup_share(token)
     if not row:
         abort(404)
     _, target_path, is_dir, expires_at = row
@@ -959,40 +1571,81 @@ def shared_entry(token):
 
     if not is_dir:
         # single-file share -> download
-        return send_file(target, as_attachment=True, download_name=target.name)
+        return _send_attachment(target)
 
     # folder share: allow browsing and downloading child files within the folder
     child = request.args.get('p', '').strip()
-    current = (target / child) if child else target
-    current = current.resolve()
-    if not str(current).startswith(str(target.resolve())):
+    base_s = _resolved_share_base(target_path)
+    cur_s = os.path.realpath(os.path.join(base_s, child)) if child else base_s
+    # exact match or prefix + separator -- a bare startswith would let
+    # /srv/share2 pass a check against /srv/share
+    if cur_s != base_s and not cur_s.startswith(base_s + os.sep):
         abort(400)
-    if current.is_file():
-        return send_file(current, as_attachment=True, download_name=current.name)
-
+    current = Path(cur_s)
+    if os.path.isfile(current):
+        return _send_attachment(current)
+
+    with os.scandir(current) as it:
+        entries = list(it)
+    # warm DirEntry stat caches in inode order first: on cold page cache /
+    # rotational media this reads the inode table roughly sequentially
+    # instead of seeking around in alphabetical order
+    for e in sorted(entries, key=lambda e: e.inode()):
+        if not e.is_dir(follow_symlinks=False):
+            try:
+                e.stat(follow_symlinks=False)
+            except OSError:
+                pass
+    entries.sort(key=lambda e: (not e.is_dir(follow_symlinks=False),
+                                e.name.lower()))
     items = []
-    for ch in sorted(current.iterdir(), key=lambda x: (x.is_file(), x.name.lower())):
-        st = ch.stat()
-        items.append({'name': ch.name, 'type': 'file' if ch.is_file() else 'dir',
-                      'size': st.st_size, 'mtime': int(st.st_mtime)})
-    rel = str(current.relative_to(target)) if current != target else ''
-    parent_q = '' if rel == '' else f"?p={Path(rel).parent.as_posix()}"
-    html = [f"<h3>Shared folder: /{target.name}{('/'+rel) if rel else ''}</h3>"]
-    if rel:
-        html.append(f'<p><a href="/s/{token}{parent_q}">⬅️ Up</a></p>')
-    html.append('<ul>')
-    for it in items:
-        if it['type'] == 'dir':
-            html.append(f'<li>📁 <a href="/s/{token}?p={(Path(rel)/it["name"]).as_posix()}">{it["name"]}</a></li>')
+    for e in entries:
+        if e.is_dir(follow_symlinks=False):
+            # nothing in the share page shows dir sizes, so don't stat them
+            items.append({'name': e.name, 'type': 'dir', 'size': 0, 'mtime': 0})
         else:
-            href = f'/s/{token}?p={(Path(rel)/it["name"]).as_posix()}'
-            html.append(f'<li>📄 <a href="{href}">{it["name"]}</a> — <a href="{href}">download</a></li>')
-    html.append('</ul>')
-    return "\n".join(html)
+            st = e.stat(follow_symlinks=False)
+            items.append({'name': e.name, 'type': 'file',
+                          'size': st.st_size, 'mtime': int(st.st_mtime)})
+    rel = cur_s[len(base_s) + 1:] if cur_s != base_s else ''
+    parent_q = f"?p={quote(rel.rsplit(os.sep, 1)[0])}" if os.sep in rel else ''
+    # hrefs are plain string concat here so the compiled template's loop
+    # doesn't allocate Path objects per row; the invariant ?p= prefix is
+    # quoted once outside the loop, only the name varies per entry
+    prefix = f'/s/{token}?p={quote(rel) + "/" if rel else ""}'
+    for it in items:
+        it['href'] = prefix + quote(it['name'], safe='')
+    # stream the template instead of render()ing one big string -- for huge
+    # folders the first rows hit the socket while the rest are still rendering
+    stream = _SHARE_TPL.stream(root_name=target.name, rel=rel, token=token,
+                               parent_q=parent_q, items=items)
+    stream.enable_buffering(50)
+    return Response(stream, mimetype='text/html')
 
 # ==================== Multi-Note App (Upgraded & Fixed) ====================
 NOTES_DIR = '/data/daily_notes'
-KST = ZoneInfo("Asia/Seoul") 
+# fixed UTC+9 -- Korea hasn't observed DST since 1988, so a static offset
+# behaves identically to the zoneinfo lookup without loading tzdata
+KST = timezone(timedelta(hours=9))
+
+# [dir st_mtime_ns, set of date strings] -- the note dir only changes when a
+# note is created/deleted, so rescan only when its mtime moves
+_NOTES_DATES_CACHE = [None, set()]
+
+# strict YYYY-MM-DD shape; all we need for traversal safety, without the
+# datetime object strptime builds and throws away
+_DATE_RE = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+_today_cache = [0.0, '']  # [monotonic ts, 'YYYY-MM-DD']
+
+def _today_kst():
+    """Today's date in KST, refreshed at most every 30s -- good enough for a
+    date that changes once a day, and skips a tz-aware now() per list call."""
+    now = time.monotonic()
+    if now - _today_cache[0] > 30.0:
+        _today_cache[1] = datetime.now(KST).strftime('%Y-%m-%d')
+        _today_cache[0] = now
+    return _today_cache[1]
 
 @app.route('/notes')
 @auth_required_page
@@ -1010,59 +1663,102 @@ def notes_list():
     os.makedirs(NOTES_DIR, exist_ok=True)
     
     # Also add today's KST date to the list if it doesn't exist yet
-    today_str = datetime.now(KST).strftime('%Y-%m-%d')
-    
-    note_files = glob.glob(os.path.join(NOTES_DIR, 'note_*.txt'))
-    
-    # Extract YYYY-MM-DD from 'daily_notes/note_YYYY-MM-DD.txt'
-    dates = {os.path.basename(f)[5:-4] for f in note_files}
+    today_str = _today_kst()
+
+    mtime = os.stat(NOTES_DIR).st_mtime_ns
+    if _NOTES_DATES_CACHE[0] != mtime:
+        # Extract YYYY-MM-DD from 'note_YYYY-MM-DD.txt'
+        with os.scandir(NOTES_DIR) as it:
+            _NOTES_DATES_CACHE[1] = {e.name[5:-4] for e in it
+                                     if e.name.startswith('note_') and e.name.endswith('.txt')}
+        _NOTES_DATES_CACHE[0] = mtime
+
+    dates = set(_NOTES_DATES_CACHE[1])
     dates.add(today_str) # Use a set to automatically handle duplicates
-    
-    sorted_dates = sorted(list(dates), reverse=True)
-    
-    return jsonify(sorted_dates)
+
+    return jsonify(sorted(dates, reverse=True))
 
 @app.route('/notes/api/get/<string:date_str>')
 @auth_required_json
 def notes_get(date_str):
     """Returns the content of a specific note file."""
+    # Validate date format to prevent directory traversal
+    if not _DATE_RE.fullmatch(date_str):
+        return jsonify([{'task': '', 'status': 'to-do'}])
     try:
-        # Validate date format to prevent directory traversal
-        datetime.strptime(date_str, '%Y-%m-%d')
         filename = f"note_{date_str}.txt"
         note_path = os.path.join(NOTES_DIR, filename)
         
-        if os.path.exists(note_path):
-            with open(note_path, 'r', encoding='utf-8') as f:
-                content = json.load(f)
-            return jsonify(content)
-        else:
-            # If note for that day doesn't exist, return a default empty structure
-            return jsonify([{'task': '', 'status': 'to-do'}])
+        # EAFP: just open it -- a missing note falls through to the default
+        # below, which saves a stat() on the hot path where the file exists
+        with open(note_path, 'rb') as f:
+            raw = f.read()
+        content = orjson.loads(raw) if orjson else json.loads(raw)
+        return jsonify(content)
     except (ValueError, FileNotFoundError, json.JSONDecodeError):
-        # Return default structure on any error (e.g., empty file)
+        # Return default structure on any error (e.g., missing/empty file)
         return jsonify([{'task': '', 'status': 'to-do'}])
 
+@app.route('/notes/api/bulk')
+@auth_required_json
+def notes_bulk():
+    """Returns {date: content} for every note in an inclusive ?from=&to=
+    range, so the UI can prefetch a stretch of days in one request instead
+    of one /get round trip per day."""
+    start = request.args.get('from', '')
+    end = request.args.get('to', '')
+    if not (_DATE_RE.fullmatch(start) and _DATE_RE.fullmatch(end)) or start > end:
+        return jsonify({'error': 'Invalid date range'}), 200
+    os.makedirs(NOTES_DIR, exist_ok=True)
+    out = {}
+    with os.scandir(NOTES_DIR) as it:
+        for e in it:
+            if not (e.name.startswith('note_') and e.name.endswith('.txt')):
+                continue
+            d = e.name[5:-4]  # ISO dates compare fine as strings
+            if start <= d <= end:
+                try:
+                    with open(e.path, 'rb') as f:
+                        raw = f.read()
+                    out[d] = orjson.loads(raw) if orjson else json.loads(raw)
+                except (ValueError, OSError):
+                    continue  # unreadable/corrupt note, skip it
+    return jsonify(out)
+
 @app.route('/notes/api/save/<string:date_str>', methods=['POST'])
 @auth_required_json
 def notes_save_api(date_str): # Renamed to avoid conflict with function `save`
     """Saves the content for a specific note."""
-    try:
-        datetime.strptime(date_str, '%Y-%m-%d')
-        filename = f"note_{date_str}.txt"
-        note_path = os.path.join(NOTES_DIR, filename)
-        
-        data = request.get_json()
-        if data is None:
-            return jsonify({'status': 'error', 'message': 'Invalid data'}), 200
-            
-        os.makedirs(NOTES_DIR, exist_ok=True)
-        with open(note_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2)
-            
-        return jsonify({'status': 'success', 'message': f'Note for {date_str} saved!'})
-    except ValueError:
+    if not _DATE_RE.fullmatch(date_str):
         return jsonify({'error': 'Invalid date format'}), 200
+    filename = f"note_{date_str}.txt"
+    note_path = os.path.join(NOTES_DIR, filename)
+
+    data = request.get_json()
+    if data is None:
+        return jsonify({'status': 'error', 'message': 'Invalid data'}), 200
+
+    os.makedirs(NOTES_DIR, exist_ok=True)
+    # write to a temp file in the same dir and rename over the target so a
+    # crash mid-write can't leave a truncated note; compact separators, the
+    # notes UI never looks at the file's indentation
+    fd, tmp_path = tempfile.mkstemp(dir=NOTES_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if orjson:
+                f.write(orjson.dumps(data))
+            else:
+                f.write(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+        os.replace(tmp_path, note_path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    _NOTES_DATES_CACHE[0] = None  # a brand-new date may have appeared
+
+    return jsonify({'status': 'success', 'message': f'Note for {date_str} saved!'})
 @app.route('/health')
 def health_check():
     """Health check endpoint."""
@@ -1085,12 +1781,12 @@ def onlyoffice_editor(rel_path):
         #    Let's re-use your share logic to create a temporary, 1-hour link.
         token = secrets.token_urlsafe(16)
         expires_at = int(time.time() + 3600) # 1 hour expiry
-        with sqlite3.connect(DB_PATH) as conn:
-            conn.execute(
+        with _DB_LOCK:
+            _DB.execute(
                 'INSERT INTO shares(token, target_path, is_dir, expires_at, created_at) VALUES (?,?,?,?,?)',
                 (token, str(p), 0, expires_at, int(time.time()))
             )
-            conn.commit()
+        _lookup_share.cache_clear()
         
         # This is the URL the OnlyOffice *server* will use to download the file
         file_url = urljoin(KOALA_INTERNAL_URL, f'/s/{token}')
@@ -1208,6 +1904,13 @@ def onlyoffice_save_callback():
 # ---------------------------
 
 # ==================== JSON error formatting ====================
+@lru_cache(maxsize=64)
+def _error_body(code, description):
+    # the same handful of (code, default description) pairs cover nearly all
+    # errors — 404 scans/probes especially — so serialize each once
+    payload = {'ok': False, 'error': description, 'code': code}
+    return orjson.dumps(payload) if orjson is not None else json.dumps(payload).encode()
+
 @app.errorhandler(400)
 @app.errorhandler(403)
 @app.errorhandler(404)
@@ -1216,10 +1919,14 @@ def onlyoffice_save_callback():
 @app.errorhandler(500)
 def json_errors(err):
     code = getattr(err, 'code', 500)
-    app.logger.error(f'HTTP Error {code}: {getattr(err, "description", str(err))} - URL: {request.url}')
-    return jsonify({'ok': False, 'error': getattr(err, 'description', str(err)), 'code': code}), code
+    desc = str(getattr(err, 'description', str(err)))
+    app.logger.error(f'HTTP Error {code}: {desc} - URL: {request.url}')
+    return Response(_error_body(code, desc), status=code, mimetype='application/json')
 
 # ==================== Main ====================
 if __name__ == '__main__':
-    socketio.run(app, host='0.0.0.0', port=5000, debug=True)
+    # debug + reloader only when explicitly asked for; the reloader imports
+    # the whole module twice and the debugger slows every request
+    debug = os.environ.get('FLASK_DEBUG') == '1'
+    socketio.run(app, host='0.0.0.0', port=5000, debug=debug, use_reloader=debug)
 